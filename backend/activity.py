@@ -4,32 +4,121 @@ Activity logging utilities.
 from database import get_database
 from models import ActivityLog
 from datetime import datetime
+from typing import Dict, List, Optional, Set
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Batching settings for the background activity writer
+ACTIVITY_QUEUE_SIZE = 10000
+ACTIVITY_BATCH_SIZE = 500
+ACTIVITY_FLUSH_INTERVAL = 0.2  # seconds
 
-async def log_activity(user_email: str, action: str, details: str = None):
-    """Log user activity to database."""
+# Sentinel telling the flusher to write what is left and exit
+_STOP = object()
+
+# Fields returned by activity queries
+ACTIVITY_PROJECTION = {"user_email": 1, "action": 1, "details": 1, "timestamp": 1}
+
+_activity_queue: Optional[asyncio.Queue] = None
+_flusher_task: Optional[asyncio.Task] = None
+
+# Direct writes in flight, referenced so they aren't garbage collected
+_pending_writes: Set[asyncio.Task] = set()
+
+
+async def _write_activities(activities: List[Dict]):
+    """Insert a batch of activities in one round-trip."""
     try:
         db = get_database()
-        activity = {
-            "user_email": user_email,
-            "action": action,
-            "details": details,
-            "timestamp": datetime.utcnow()
-        }
-        await db.activity_logs.insert_one(activity)
-        logger.info(f"Activity logged: {user_email} - {action}")
+        await db.activity_logs.insert_many(activities, ordered=False)
+        logger.debug("Flushed %s activities", len(activities))
     except Exception as e:
-        logger.error(f"Failed to log activity: {e}")
+        logger.error("Failed to flush %s activities: %s", len(activities), e)
+
+
+def _drain_queue(queue: asyncio.Queue, batch: List, limit: Optional[int] = None) -> List:
+    """Move queued items into batch without waiting."""
+    while not queue.empty() and (limit is None or len(batch) < limit):
+        batch.append(queue.get_nowait())
+    return batch
+
+
+async def _flush_activities(queue: asyncio.Queue):
+    """Background task writing queued activities to MongoDB in batches."""
+    stopping = False
+    while not stopping:
+        batch = [await queue.get()]
+        if batch[0] is not _STOP and len(batch) + queue.qsize() < ACTIVITY_BATCH_SIZE:
+            # Give concurrent requests a moment to add to this batch;
+            # a full batch is already waiting under load, so write it now
+            await asyncio.sleep(ACTIVITY_FLUSH_INTERVAL)
+        _drain_queue(queue, batch, ACTIVITY_BATCH_SIZE)
+        
+        stopping = any(item is _STOP for item in batch)
+        activities = [item for item in batch if item is not _STOP]
+        if activities:
+            await _write_activities(activities)
+    
+    # Anything logged while shutting down
+    remaining = [item for item in _drain_queue(queue, []) if item is not _STOP]
+    if remaining:
+        await _write_activities(remaining)
+
+
+def start_activity_flusher():
+    """Start the background task that batches activity inserts."""
+    global _activity_queue, _flusher_task
+    if _flusher_task is None:
+        _activity_queue = asyncio.Queue(maxsize=ACTIVITY_QUEUE_SIZE)
+        _flusher_task = asyncio.create_task(_flush_activities(_activity_queue))
+        logger.info("Activity flusher started")
+
+
+async def stop_activity_flusher():
+    """Flush pending activities and stop the background writer."""
+    global _activity_queue, _flusher_task
+    if _flusher_task is None:
+        return
+    
+    queue, task = _activity_queue, _flusher_task
+    _activity_queue, _flusher_task = None, None
+    await queue.put(_STOP)
+    await task
+    logger.info("Activity flusher stopped")
+
+
+def log_activity(user_email: str, action: str, details: str = None):
+    """Queue user activity for the background writer without blocking the caller."""
+    activity = {
+        "user_email": user_email,
+        "action": action,
+        "details": details,
+        "timestamp": datetime.utcnow()
+    }
+    
+    # Without a running flusher (e.g. scripts), write in a detached task
+    if _activity_queue is None:
+        task = asyncio.get_running_loop().create_task(_write_activities([activity]))
+        _pending_writes.add(task)
+        task.add_done_callback(_pending_writes.discard)
+        return
+    
+    try:
+        _activity_queue.put_nowait(activity)
+        logger.info("Activity queued: %s - %s", user_email, action)
+    except asyncio.QueueFull:
+        logger.warning("Activity queue full, dropping: %s - %s", user_email, action)
 
 
 async def get_recent_activities(limit: int = 50):
     """Get recent activity logs."""
     try:
         db = get_database()
-        activities = await db.activity_logs.find().sort("timestamp", -1).limit(limit).to_list(limit)
+        activities = await db.activity_logs.find(
+            {}, projection=ACTIVITY_PROJECTION, batch_size=limit
+        ).sort("timestamp", -1).limit(limit).to_list(limit)
         
         # Convert ObjectId to string
         for activity in activities:
@@ -37,7 +126,7 @@ async def get_recent_activities(limit: int = 50):
         
         return activities
     except Exception as e:
-        logger.error(f"Failed to retrieve activities: {e}")
+        logger.error("Failed to retrieve activities: %s", e)
         return []
 
 
@@ -46,7 +135,7 @@ async def get_user_activities(user_email: str, limit: int = 20):
     try:
         db = get_database()
         activities = await db.activity_logs.find(
-            {"user_email": user_email}
+            {"user_email": user_email}, projection=ACTIVITY_PROJECTION, batch_size=limit
         ).sort("timestamp", -1).limit(limit).to_list(limit)
         
         # Convert ObjectId to string
@@ -55,7 +144,7 @@ async def get_user_activities(user_email: str, limit: int = 20):
         
         return activities
     except Exception as e:
-        logger.error(f"Failed to retrieve user activities: {e}")
+        logger.error("Failed to retrieve user activities: %s", e)
         return []
 
 
@@ -1,16 +1,21 @@
 """
 Authentication and authorization utilities.
 """
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from typing import Optional, Tuple
+import jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from models import UserInDB, User
 from database import get_database
+from cache import trim_ttl_cache
 from config import settings
+import asyncio
+import hashlib
 import logging
+import time
 from fastapi import Request
 
 logger = logging.getLogger(__name__)
@@ -28,12 +33,45 @@ pwd_context = CryptContext(
 # HTTP Bearer security scheme
 security = HTTPBearer(auto_error=False)
 
+# Recently verified credentials: {keyed digest of hash + password: expiry}.
+# Only successful verifications are cached, and only briefly.
+VERIFY_CACHE_TTL_SECONDS = 30
+VERIFY_CACHE_MAX_SIZE = 10_000
+_verify_cache: "OrderedDict[bytes, float]" = OrderedDict()
+_verify_cache_key = hashlib.sha256(settings.SECRET_KEY.encode("utf-8")).digest()
+
+# Recently decoded tokens: {token: (email, exp timestamp)}
+TOKEN_CACHE_MAX_SIZE = 4096
+_token_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def verify_password_cached(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password off the event loop, skipping it for recent successful logins."""
+    key = hashlib.blake2b(
+        hashed_password.encode("utf-8") + b"|" + plain_password.encode("utf-8"),
+        key=_verify_cache_key,
+        digest_size=16
+    ).digest()
+    now = time.monotonic()
+    
+    expiry = _verify_cache.get(key)
+    if expiry is not None and expiry > now:
+        return True
+    
+    if not await asyncio.to_thread(verify_password, plain_password, hashed_password):
+        return False
+    
+    _verify_cache[key] = now + VERIFY_CACHE_TTL_SECONDS
+    _verify_cache.move_to_end(key)
+    trim_ttl_cache(_verify_cache, VERIFY_CACHE_MAX_SIZE, now, lambda expiry: expiry)
+    return True
+
+
 def get_password_hash(password: str) -> str:
     """Generate password hash."""
     return pwd_context.hash(password)
@@ -52,6 +90,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> Optional[str]:
+    """Decode a JWT and return its subject email, or None if invalid or expired."""
+    cached = _token_cache.get(token)
+    if cached is not None:
+        email, expires_at = cached
+        if expires_at > time.time():
+            _token_cache.move_to_end(token)
+            return email
+        del _token_cache[token]
+    
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    
+    email = payload.get("sub")
+    if email is None:
+        return None
+    
+    # Only tokens with an expiry are cached, and only until they expire
+    if "exp" in payload:
+        _token_cache[token] = (email, float(payload["exp"]))
+        if len(_token_cache) > TOKEN_CACHE_MAX_SIZE:
+            _token_cache.popitem(last=False)
+    return email
+
+
 async def get_user_by_email(email: str) -> Optional[UserInDB]:
     """Retrieve user from database by email."""
     db = get_database()
@@ -74,7 +139,7 @@ async def authenticate_user(email: str, password: str) -> Optional[UserInDB]:
     user = await get_user_by_email(email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_cached(password, user.hashed_password):
         return None
     return user
 
@@ -88,25 +153,21 @@ async def get_current_user(request: Request,credentials: HTTPAuthorizationCreden
     )
     if request.method == "OPTIONS":
         return None 
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = await get_user_by_email(email)
-    if user is None:
+    email = decode_access_token(credentials.credentials)
+    if email is None:
         raise credentials_exception
     
-    # Update last seen
+    # Load the user and update last seen concurrently (a no-op for unknown emails)
     db = get_database()
-    await db.users.update_one(
-        {"email": email},
-        {"$set": {"last_seen": datetime.utcnow()}}
+    user, _ = await asyncio.gather(
+        get_user_by_email(email),
+        db.users.update_one(
+            {"email": email},
+            {"$set": {"last_seen": datetime.utcnow()}}
+        )
     )
+    if user is None:
+        raise credentials_exception
     
     return User(
         _id=user.id,
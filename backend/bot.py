@@ -2,34 +2,95 @@
 AI Bot with intent-response framework for WhatsApp-like interactions.
 """
 import re
+import ast
+import random
+import time
+from collections import deque, OrderedDict
+from functools import lru_cache
+from itertools import islice
+from types import CodeType
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Shared random generator for picking responses
+_rng = random.Random()
+
+# Words and punctuation stripped from a message before reading it as an expression
+_EXPRESSION_NOISE_RE = re.compile(r"[a-z?!=,:;']+", re.IGNORECASE)
+
+# A message that is nothing but an arithmetic expression
+_EXPRESSION_RE = re.compile(r"[\d+\-*/().\s]+")
+
+# Only short messages and expressions are memoized so the caches stay small
+MAX_CACHED_MESSAGE_LENGTH = 256
+
+
+def _search_intent_name(dispatch_re: re.Pattern, message: str) -> Optional[str]:
+    """Return the name of the intent matched by the dispatch pattern, if any."""
+    match = dispatch_re.search(message)
+    return match.lastgroup if match else None
+
+
+@lru_cache(maxsize=4096)
+def _match_intent_name(dispatch_re: re.Pattern, message_lower: str) -> Optional[str]:
+    """Cached intent lookup for frequently repeated short messages."""
+    return _search_intent_name(dispatch_re, message_lower)
+
+
+# AST node types allowed in bot calculations
+_ALLOWED_EXPR_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.UAdd, ast.USub
+)
+
+
+def _validate_expr(tree: ast.AST):
+    """Ensure an expression tree only contains plain arithmetic."""
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_EXPR_NODES):
+            raise ValueError(f"Unsupported expression element: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError("Only numeric constants are allowed")
+
+
+def _build_expr(expr_str: str) -> CodeType:
+    """Parse, validate and compile an arithmetic expression."""
+    tree = ast.parse(expr_str, mode="eval")
+    _validate_expr(tree)
+    return compile(tree, "<bot>", "eval")
+
+
+@lru_cache(maxsize=512)
+def _compile_expr(expr_str: str) -> CodeType:
+    """Cached compile for frequently repeated short expressions."""
+    return _build_expr(expr_str)
+
 
 class Intent:
     """Represents a bot intent with patterns and responses."""
     
     def __init__(self, name: str, patterns: List[str], responses: List[str], context_required: bool = False):
         self.name = name
-        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        # Raw patterns are compiled once, combined into the bot's dispatch pattern
+        self.patterns_raw = patterns
         self.responses = responses
+        self.response_count = len(responses)
         self.context_required = context_required
-    
-    def match(self, text: str) -> bool:
-        """Check if text matches any pattern."""
-        return any(pattern.search(text) for pattern in self.patterns)
 
 
 class BotContext:
     """Maintains conversation context for a user."""
     
+    MAX_HISTORY = 200
+    
     def __init__(self):
-        self.history: List[Dict] = []
+        self.history: deque = deque(maxlen=self.MAX_HISTORY)
         self.last_intent: Optional[str] = None
         self.user_data: Dict = {}
+        self.last_active = time.monotonic()
     
     def add_message(self, message: str, is_user: bool, intent: Optional[str] = None):
         """Add a message to conversation history."""
@@ -44,7 +105,138 @@ class BotContext:
     
     def get_recent_messages(self, count: int = 5) -> List[Dict]:
         """Get recent messages from history."""
-        return self.history[-count:]
+        recent = list(islice(reversed(self.history), count))
+        recent.reverse()
+        return recent
+
+
+# Bot intents, compiled once per process and shared read-only by every AIBot.
+# Order matters: the fallback intent must stay last.
+_INTENTS: Tuple[Intent, ...] = (
+    Intent(
+        "greeting",
+        [r"\b(?:hi|hello|hey|greetings|good morning|good evening|good afternoon)\b"],
+        [
+            "Hello! I'm WhatsEase, your AI assistant. How can I help you today?",
+            "Hi there! I'm WhatsEase. What can I do for you?",
+            "Hey! WhatsEase here. How may I assist you?"
+        ]
+    ),
+    Intent(
+        "goodbye",
+        [r"\b(?:bye|goodbye|see you|talk later|take care)\b"],
+        [
+            "Goodbye! Feel free to reach out anytime!",
+            "See you later! Have a great day!",
+            "Take care! I'm always here if you need assistance."
+        ]
+    ),
+    Intent(
+        "help",
+        [r"\b(?:help|assist|support|what can you do)\b"],
+        [
+            "I'm WhatsEase, your AI assistant! I can help you with:\n"
+            "• General questions and conversation\n"
+            "• Information about weather and time\n"
+            "• Setting reminders\n"
+            "• Quick calculations\n"
+            "Just ask me anything!"
+        ]
+    ),
+    Intent(
+        "weather",
+        [r"\b(?:weather|temperature|forecast|climate)\b"],
+        [
+            "I can help with weather information! For the most accurate data, "
+            "I'd need to integrate with a weather API. Where would you like to check the weather?",
+            "Weather queries are one of my specialties! Which location are you interested in?"
+        ]
+    ),
+    Intent(
+        "time",
+        [r"\b(?:time|what time|current time|clock)\b"],
+        [
+            "The current time is {now} UTC. "
+            "Would you like the time in a specific timezone?"
+        ]
+    ),
+    Intent(
+        "reminder",
+        [r"\b(?:remind|reminder|remember|don't forget)\b"],
+        [
+            "I can help set reminders! Please tell me what you'd like to be reminded about "
+            "and when.",
+            "Reminder feature coming up! What should I remind you about?"
+        ]
+    ),
+    Intent(
+        "math",
+        [r"(?:\b(?:calculate|compute|math|add|subtract|multiply|divide)\b|[+\-*/])"],
+        [
+            "I can help with calculations! What would you like me to compute?",
+            "Math is my strong suit! Give me an expression to calculate."
+        ]
+    ),
+    Intent(
+        "name_query",
+        [r"\b(?:your name|who are you|what are you)\b"],
+        [
+            "I'm WhatsEase, an AI-powered assistant designed to help you with various tasks!",
+            "My name is WhatsEase. I'm here to make your life easier through intelligent assistance."
+        ]
+    ),
+    Intent(
+        "thanks",
+        [r"\b(?:thanks|thank you|appreciate|grateful)\b"],
+        [
+            "You're welcome! Happy to help!",
+            "My pleasure! Let me know if you need anything else.",
+            "Glad I could help! Feel free to ask anytime."
+        ]
+    ),
+    Intent(
+        "how_are_you",
+        [r"\b(?:how are you|how's it going|how do you do)\b"],
+        [
+            "I'm functioning perfectly, thank you for asking! How can I assist you today?",
+            "I'm doing great! Ready to help you with whatever you need.",
+            "All systems operational! What can I do for you?"
+        ]
+    ),
+    Intent(
+        "joke",
+        [r"\b(?:joke|funny|make me laugh|humor)\b"],
+        [
+            "Why don't programmers like nature? It has too many bugs! 🐛",
+            "What's a programmer's favorite hangout place? Foo Bar! 🍺",
+            "Why do Java developers wear glasses? Because they don't C#! 👓"
+        ]
+    ),
+    Intent(
+        "fallback",
+        [r".*"],
+        [
+            "I'm not sure I understand. Could you rephrase that?",
+            "Interesting! Can you tell me more about what you need?",
+            "I'm still learning! Could you ask that in a different way?",
+            "That's a bit outside my current knowledge. Try asking me about weather, time, or general help!"
+        ]
+    )
+)
+
+
+def _build_dispatch_pattern(intents: Tuple[Intent, ...]) -> re.Pattern:
+    """Combine all intent patterns into one alternation with a named group per intent."""
+    return re.compile(
+        "|".join(
+            f"(?P<{intent.name}>{'|'.join(intent.patterns_raw)})"
+            for intent in intents if intent.name != "fallback"
+        ),
+        re.IGNORECASE
+    )
+
+
+_DISPATCH_RE = _build_dispatch_pattern(_INTENTS)
 
 
 class AIBot:
@@ -52,137 +244,49 @@ class AIBot:
     
     BOT_EMAIL = "whatsease@bot.com"
     BOT_NAME = "WhatsEase"
+    MAX_USER_CONTEXTS = 10_000
+    CONTEXT_TTL_SECONDS = 3600
     
     def __init__(self):
-        self.intents = self._initialize_intents()
-        self.user_contexts: Dict[str, BotContext] = {}
+        self.intents = _INTENTS
+        self._intents_by_name: Dict[str, Intent] = {intent.name: intent for intent in _INTENTS}
+        self._dispatch_re = _DISPATCH_RE
+        self.user_contexts: "OrderedDict[str, BotContext]" = OrderedDict()
         logger.info("AI Bot initialized")
     
-    def _initialize_intents(self) -> List[Intent]:
-        """Initialize bot intents with patterns and responses."""
-        return [
-            Intent(
-                "greeting",
-                [r"\b(hi|hello|hey|greetings|good morning|good evening|good afternoon)\b"],
-                [
-                    "Hello! I'm WhatsEase, your AI assistant. How can I help you today?",
-                    "Hi there! I'm WhatsEase. What can I do for you?",
-                    "Hey! WhatsEase here. How may I assist you?"
-                ]
-            ),
-            Intent(
-                "goodbye",
-                [r"\b(bye|goodbye|see you|talk later|take care)\b"],
-                [
-                    "Goodbye! Feel free to reach out anytime!",
-                    "See you later! Have a great day!",
-                    "Take care! I'm always here if you need assistance."
-                ]
-            ),
-            Intent(
-                "help",
-                [r"\b(help|assist|support|what can you do)\b"],
-                [
-                    "I'm WhatsEase, your AI assistant! I can help you with:\n"
-                    "• General questions and conversation\n"
-                    "• Information about weather and time\n"
-                    "• Setting reminders\n"
-                    "• Quick calculations\n"
-                    "Just ask me anything!"
-                ]
-            ),
-            Intent(
-                "weather",
-                [r"\b(weather|temperature|forecast|climate)\b"],
-                [
-                    "I can help with weather information! For the most accurate data, "
-                    "I'd need to integrate with a weather API. Where would you like to check the weather?",
-                    "Weather queries are one of my specialties! Which location are you interested in?"
-                ]
-            ),
-            Intent(
-                "time",
-                [r"\b(time|what time|current time|clock)\b"],
-                [
-                    f"The current time is {datetime.utcnow().strftime('%H:%M:%S')} UTC. "
-                    "Would you like the time in a specific timezone?"
-                ]
-            ),
-            Intent(
-                "reminder",
-                [r"\b(remind|reminder|remember|don't forget)\b"],
-                [
-                    "I can help set reminders! Please tell me what you'd like to be reminded about "
-                    "and when.",
-                    "Reminder feature coming up! What should I remind you about?"
-                ]
-            ),
-            Intent(
-                "math",
-                [r"\b(calculate|compute|math|add|subtract|multiply|divide|\+|\-|\*|\/)\b"],
-                [
-                    "I can help with calculations! What would you like me to compute?",
-                    "Math is my strong suit! Give me an expression to calculate."
-                ]
-            ),
-            Intent(
-                "name_query",
-                [r"\b(your name|who are you|what are you)\b"],
-                [
-                    "I'm WhatsEase, an AI-powered assistant designed to help you with various tasks!",
-                    "My name is WhatsEase. I'm here to make your life easier through intelligent assistance."
-                ]
-            ),
-            Intent(
-                "thanks",
-                [r"\b(thanks|thank you|appreciate|grateful)\b"],
-                [
-                    "You're welcome! Happy to help!",
-                    "My pleasure! Let me know if you need anything else.",
-                    "Glad I could help! Feel free to ask anytime."
-                ]
-            ),
-            Intent(
-                "how_are_you",
-                [r"\b(how are you|how's it going|how do you do)\b"],
-                [
-                    "I'm functioning perfectly, thank you for asking! How can I assist you today?",
-                    "I'm doing great! Ready to help you with whatever you need.",
-                    "All systems operational! What can I do for you?"
-                ]
-            ),
-            Intent(
-                "joke",
-                [r"\b(joke|funny|make me laugh|humor)\b"],
-                [
-                    "Why don't programmers like nature? It has too many bugs! 🐛",
-                    "What's a programmer's favorite hangout place? Foo Bar! 🍺",
-                    "Why do Java developers wear glasses? Because they don't C#! 👓"
-                ]
-            ),
-            Intent(
-                "fallback",
-                [r".*"],
-                [
-                    "I'm not sure I understand. Could you rephrase that?",
-                    "Interesting! Can you tell me more about what you need?",
-                    "I'm still learning! Could you ask that in a different way?",
-                    "That's a bit outside my current knowledge. Try asking me about weather, time, or general help!"
-                ]
-            )
-        ]
-    
     def _get_context(self, user_email: str) -> BotContext:
-        """Get or create context for a user."""
-        if user_email not in self.user_contexts:
-            self.user_contexts[user_email] = BotContext()
-        return self.user_contexts[user_email]
+        """Get or create context for a user, evicting idle and least recently used contexts."""
+        now = time.monotonic()
+        self._evict_expired(now)
+        
+        context = self.user_contexts.get(user_email)
+        if context is not None:
+            self.user_contexts.move_to_end(user_email)
+        else:
+            context = self.user_contexts[user_email] = BotContext()
+            if len(self.user_contexts) > self.MAX_USER_CONTEXTS:
+                self.user_contexts.popitem(last=False)
+        
+        context.last_active = now
+        return context
+    
+    def _evict_expired(self, now: float):
+        """Drop contexts idle for longer than the TTL (oldest are kept at the front)."""
+        while self.user_contexts:
+            oldest = next(iter(self.user_contexts.values()))
+            if now - oldest.last_active <= self.CONTEXT_TTL_SECONDS:
+                break
+            self.user_contexts.popitem(last=False)
     
     def _match_intent(self, message: str) -> Intent:
         """Match message to an intent."""
-        for intent in self.intents:
-            if intent.name != "fallback" and intent.match(message):
-                return intent
+        if len(message) <= MAX_CACHED_MESSAGE_LENGTH:
+            intent_name = _match_intent_name(self._dispatch_re, message.lower())
+        else:
+            intent_name = _search_intent_name(self._dispatch_re, message)
+        
+        if intent_name:
+            return self._intents_by_name[intent_name]
         
         # Return fallback if no match
         return self.intents[-1]
@@ -190,15 +294,20 @@ class AIBot:
     def _calculate_expression(self, message: str) -> Optional[str]:
         """Attempt to calculate a mathematical expression."""
         try:
-            # Extract numbers and operators
-            expression = re.search(r'[\d\+\-\*/\(\)\.\s]+', message)
-            if expression:
-                expr_str = expression.group().strip()
-                # Safe evaluation
-                result = eval(expr_str, {"__builtins__": {}}, {})
+            # Drop surrounding words, then require a pure expression
+            cleaned = _EXPRESSION_NOISE_RE.sub(" ", message)
+            if _EXPRESSION_RE.fullmatch(cleaned):
+                # Collapse whitespace so spacing variants share a cache entry
+                expr_str = " ".join(cleaned.split())
+                if len(expr_str) <= MAX_CACHED_MESSAGE_LENGTH:
+                    code = _compile_expr(expr_str)
+                else:
+                    code = _build_expr(expr_str)
+                # Evaluate validated arithmetic only
+                result = eval(code, {"__builtins__": {}}, {})
                 return f"The answer is: {result}"
         except Exception as e:
-            logger.debug(f"Failed to calculate expression: {e}")
+            logger.debug("Failed to calculate expression: %s", e)
         return None
     
     def process_message(self, user_email: str, message: str) -> str:
@@ -216,15 +325,16 @@ class AIBot:
                 response = calc_result
             else:
                 response = matched_intent.responses[0]
+        elif matched_intent.name == "time":
+            response = matched_intent.responses[0].format(now=datetime.utcnow().strftime('%H:%M:%S'))
         else:
             # Get response based on context
-            import random
-            response = random.choice(matched_intent.responses)
+            response = matched_intent.responses[_rng.randrange(matched_intent.response_count)]
         
         # Add bot response to context
         context.add_message(response, is_user=False, intent=matched_intent.name)
         
-        logger.info(f"Bot processed message from {user_email} - Intent: {matched_intent.name}")
+        logger.info("Bot processed message from %s - Intent: %s", user_email, matched_intent.name)
         return response
     
     def get_conversation_history(self, user_email: str, count: int = 10) -> List[Dict]:
@@ -236,7 +346,7 @@ class AIBot:
         """Clear conversation context for a user."""
         if user_email in self.user_contexts:
             del self.user_contexts[user_email]
-            logger.info(f"Cleared context for {user_email}")
+            logger.info("Cleared context for %s", user_email)
 
 
 # Global bot instance
@@ -0,0 +1,86 @@
+"""
+Short-lived per-user caching for expensive list responses.
+"""
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Any, Callable, Optional, Tuple
+import redis.asyncio as aioredis
+from config import settings
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Shared Redis client, also used for Socket.IO presence (optional)
+redis_client: Optional[aioredis.Redis] = (
+    aioredis.from_url(settings.REDIS_URL) if settings.REDIS_URL else None
+)
+
+RESPONSE_CACHE_TTL_SECONDS = 5
+RESPONSE_CACHE_MAX_SIZE = 10_000
+
+# In-process fallback when Redis isn't configured: {key: (expiry, payload)}
+_local_cache: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+
+def trim_ttl_cache(
+    cache: OrderedDict, max_size: int, now: float, expires_at: Callable[[Any], float]
+):
+    """Drop expired and overflow entries from an OrderedDict TTL cache."""
+    # Entries share one TTL, so the oldest (front) expire first
+    while cache and (len(cache) > max_size or expires_at(next(iter(cache.values()))) <= now):
+        cache.popitem(last=False)
+
+
+def chat_list_key(email: str) -> str:
+    """Cache key for a user's chat list."""
+    return f"chatlist:{email}"
+
+
+def contacts_key(email: str) -> str:
+    """Cache key for a user's contacts."""
+    return f"contacts:{email}"
+
+
+async def get_cached_response(key: str) -> Optional[bytes]:
+    """Get a cached JSON payload, if still fresh."""
+    if redis_client:
+        try:
+            return await redis_client.get(key)
+        except Exception as e:
+            logger.warning("Response cache read failed: %s", e)
+            return None
+
+    entry = _local_cache.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+async def set_cached_response(key: str, payload: bytes):
+    """Cache a JSON payload for a few seconds."""
+    if redis_client:
+        try:
+            await redis_client.setex(key, RESPONSE_CACHE_TTL_SECONDS, payload)
+        except Exception as e:
+            logger.warning("Response cache write failed: %s", e)
+        return
+
+    now = time.monotonic()
+    _local_cache[key] = (now + RESPONSE_CACHE_TTL_SECONDS, payload)
+    _local_cache.move_to_end(key)
+    trim_ttl_cache(_local_cache, RESPONSE_CACHE_MAX_SIZE, now, itemgetter(0))
+
+
+async def invalidate_user_lists(*emails: str):
+    """Drop cached chat lists and contacts after a user's messages change."""
+    keys = [key for email in emails for key in (chat_list_key(email), contacts_key(email))]
+    if redis_client:
+        try:
+            await redis_client.delete(*keys)
+        except Exception as e:
+            logger.warning("Response cache invalidation failed: %s", e)
+        return
+
+    for key in keys:
+        _local_cache.pop(key, None)
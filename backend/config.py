@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from functools import cached_property
+from typing import List, Optional
 import os
 
 
@@ -7,6 +8,15 @@ class Settings(BaseSettings):
     # MongoDB Configuration
     MONGODB_URL: str
     DATABASE_NAME: str = "chat_app"
+    MONGODB_MAX_POOL_SIZE: int = 200
+    MONGODB_MIN_POOL_SIZE: int = 20
+    MONGODB_COMPRESSORS: str = "zstd,zlib"
+    
+    # Redis for Socket.IO fan-out and presence across workers (optional)
+    REDIS_URL: Optional[str] = None
+    
+    # Activity logs older than this are purged by a TTL index
+    ACTIVITY_LOG_RETENTION_DAYS: int = 30
     
     # JWT Configuration
     SECRET_KEY: str
@@ -25,20 +35,21 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=".env",
         case_sensitive=True,
-        extra="allow"   
+        extra="allow",
+        frozen=True
     )
 
-    @property
+    @cached_property
     def cors_origins_list(self) -> List[str]:
         """Parse CORS origins from comma-separated string."""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",") if origin.strip()]
     
-    @property
+    @cached_property
     def is_production(self) -> bool:
         """Check if running in production environment."""
         return self.ENVIRONMENT.lower() == "production"
     
-    @property
+    @cached_property
     def is_development(self) -> bool:
         """Check if running in development environment."""
         return self.ENVIRONMENT.lower() == "development"
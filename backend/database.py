@@ -2,27 +2,45 @@
 Database connection and utilities for MongoDB.
 """
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
 from config import settings
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Message searches shorter than this use regex matching instead of the text index
+TEXT_SEARCH_MIN_LENGTH = 3
+
+# MongoDB error code for dropping an index that does not exist
+INDEX_NOT_FOUND = 27
+
 # Global database client
 client: AsyncIOMotorClient = None
 database: AsyncIOMotorDatabase = None
 
+# Whether the unique username index exists (see is_username_index_unique)
+username_index_unique = False
+
 
 async def connect_to_mongo():
     """Establish connection to MongoDB."""
     global client, database
     try:
-        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        client = AsyncIOMotorClient(
+            settings.MONGODB_URL,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            compressors=settings.MONGODB_COMPRESSORS,
+            retryWrites=True,
+            serverSelectionTimeoutMS=3000
+        )
         database = client[settings.DATABASE_NAME]
         # Test the connection
         await client.admin.command('ping')
         logger.info("Successfully connected to MongoDB")
     except Exception as e:
-        logger.error(f"Failed to connect to MongoDB: {e}")
+        logger.error("Failed to connect to MongoDB: %s", e)
         raise
 
 
@@ -39,22 +57,88 @@ def get_database() -> AsyncIOMotorDatabase:
     return database
 
 
+def is_username_index_unique() -> bool:
+    """Whether the database itself rejects duplicate usernames."""
+    return username_index_unique
+
+
+async def _create_unique_username_index(db: AsyncIOMotorDatabase):
+    """Create the unique username index, leaving an older non-unique one alone."""
+    global username_index_unique
+    try:
+        await db.users.create_index("username", unique=True, background=True)
+        username_index_unique = True
+    except OperationFailure as e:
+        # Older databases keep working; migrate_username_index.py upgrades them
+        username_index_unique = False
+        logger.warning(
+            "Username index is not unique (%s); run migrate_username_index.py", e
+        )
+
+
+async def _create_activity_ttl_index(db: AsyncIOMotorDatabase):
+    """Create the activity TTL index, updating its expiry if the retention setting changed."""
+    expire_after = settings.ACTIVITY_LOG_RETENTION_DAYS * 24 * 60 * 60
+    indexes = await db.activity_logs.index_information()
+    
+    # The TTL index also serves descending reads; drop the older descending index
+    if "timestamp_-1" in indexes:
+        try:
+            await db.activity_logs.drop_index("timestamp_-1")
+        except OperationFailure as e:
+            # Another worker may have dropped it first
+            if e.code != INDEX_NOT_FOUND:
+                raise
+    
+    existing = indexes.get("timestamp_1")
+    if existing is None:
+        await db.activity_logs.create_index(
+            "timestamp",
+            expireAfterSeconds=expire_after,
+            background=True
+        )
+    elif existing.get("expireAfterSeconds") != expire_after:
+        # create_index can't change options on an existing index
+        try:
+            await db.command(
+                "collMod",
+                "activity_logs",
+                index={"keyPattern": {"timestamp": 1}, "expireAfterSeconds": expire_after}
+            )
+            logger.info("Activity log retention set to %s days", settings.ACTIVITY_LOG_RETENTION_DAYS)
+        except OperationFailure as e:
+            logger.warning("Could not update activity log retention: %s", e)
+
+
 async def create_indexes():
     """Create necessary database indexes for performance."""
     db = get_database()
     
-    # Users collection indexes
-    await db.users.create_index("email", unique=True)
-    await db.users.create_index("username")
-    
-    # Messages collection indexes
-    await db.messages.create_index([("sender", 1), ("timestamp", -1)])
-    await db.messages.create_index([("recipient", 1), ("timestamp", -1)])
-    await db.messages.create_index("timestamp")
-    
-    # Activity logs collection indexes
-    await db.activity_logs.create_index([("timestamp", -1)])
-    await db.activity_logs.create_index("user_email")
+    await asyncio.gather(
+        # Users collection indexes
+        db.users.create_index("email", unique=True, background=True),
+        _create_unique_username_index(db),
+        
+        # Messages collection indexes
+        db.messages.create_index([("sender", 1), ("timestamp", -1)], background=True),
+        db.messages.create_index([("recipient", 1), ("timestamp", -1)], background=True),
+        db.messages.create_index("timestamp", background=True),
+        # Conversation reads (sorted by time) and the Sent -> Delivered update
+        db.messages.create_index([("sender", 1), ("recipient", 1), ("timestamp", 1)], background=True),
+        db.messages.create_index([("recipient", 1), ("sender", 1), ("timestamp", 1)], background=True),
+        db.messages.create_index(
+            [("recipient", 1), ("sender", 1), ("status", 1)],
+            partialFilterExpression={"status": "Sent"},
+            background=True
+        ),
+        db.messages.create_index([("content", "text")], background=True),
+        
+        # Activity logs collection indexes
+        # TTL index purges old activity; also serves timestamp-sorted reads
+        _create_activity_ttl_index(db),
+        db.activity_logs.create_index("user_email", background=True),
+        db.activity_logs.create_index([("user_email", 1), ("timestamp", -1)], background=True),
+    )
     
     logger.info("Database indexes created successfully")
 
@@ -2,30 +2,46 @@
 Main FastAPI application with Socket.IO integration.
 """
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
+import asyncio
+import atexit
 import logging
+import queue
 import sys
 import socketio
 
 
 from config import settings, log_config
 from database import connect_to_mongo, close_mongo_connection, create_indexes, get_database
+from activity import start_activity_flusher, stop_activity_flusher
 from routes import users, messages, activity
-from socket_manager import sio, get_socketio_app
+from socket_manager import sio, get_socketio_app, start_presence_refresher, stop_presence_refresher
 from bot import AIBot
 
 # Configure logging
+# Records are queued and written by a background thread so handlers never block the event loop
 log_level = logging.DEBUG if settings.is_development else logging.INFO
+log_queue: queue.Queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
 logging.basicConfig(
     level=log_level,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.StreamHandler(sys.stdout)
+        QueueHandler(log_queue)
     ]
 )
+log_listener.start()
+# Runs for the life of the process and flushes queued records at exit
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
+# Keep driver logs quiet even in development
+logging.getLogger("motor").setLevel(logging.WARNING)
+logging.getLogger("pymongo").setLevel(logging.WARNING)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -39,6 +55,8 @@ async def lifespan(app: FastAPI):
     await connect_to_mongo()
     await create_indexes()
     await initialize_bot_user()
+    start_activity_flusher()
+    start_presence_refresher()
     
     logger.info("Application started successfully!")
     logger.info("=" * 50)
@@ -47,6 +65,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down application...")
+    await stop_presence_refresher()
+    await stop_activity_flusher()
     await close_mongo_connection()
     logger.info("Application shutdown complete")
 
@@ -56,25 +76,31 @@ async def initialize_bot_user():
     db = get_database()
     
     bot_email = AIBot.BOT_EMAIL
-    bot = await db.users.find_one({"email": bot_email})
+    if await db.users.find_one({"email": bot_email}, {"_id": 1}):
+        return
+    
+    from auth import get_password_hash
+    from datetime import datetime
+    
+    bot_user = {
+        "email": bot_email,
+        "username": AIBot.BOT_NAME,
+        "full_name": "WhatsEase AI Assistant",
+        # Hashing is CPU-bound; keep it off the event loop
+        "hashed_password": await asyncio.to_thread(get_password_hash, "bot_password_not_used"),
+        "is_active": True,
+        "is_bot": True,
+        "created_at": datetime.utcnow(),
+        "last_seen": None
+    }
     
-    if not bot:
-        from auth import get_password_hash
-        from datetime import datetime
-        
-        bot_user = {
-            "email": bot_email,
-            "username": AIBot.BOT_NAME,
-            "full_name": "WhatsEase AI Assistant",
-            "hashed_password": get_password_hash("bot_password_not_used"),
-            "is_active": True,
-            "is_bot": True,
-            "created_at": datetime.utcnow(),
-            "last_seen": None
-        }
-        
-        await db.users.insert_one(bot_user)
-        logger.info("Bot user initialized")
+    # Upsert so workers starting together don't race on the insert
+    await db.users.update_one(
+        {"email": bot_email},
+        {"$setOnInsert": bot_user},
+        upsert=True
+    )
+    logger.info("Bot user initialized")
 
 
 # Create FastAPI application
@@ -82,7 +108,8 @@ app = FastAPI(
     title="WhatsApp-like Chat Application",
     description="Real-time chat application with AI bot integration",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
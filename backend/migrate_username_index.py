@@ -0,0 +1,74 @@
+"""
+One-off migration making the username index unique.
+
+Run once from the backend folder, before deploying, on databases created
+when usernames were not unique:
+
+    python migrate_username_index.py
+"""
+from pymongo.errors import OperationFailure
+from database import connect_to_mongo, close_mongo_connection, get_database
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+# MongoDB error code for dropping an index that does not exist
+INDEX_NOT_FOUND = 27
+
+
+async def find_duplicate_usernames(db) -> list:
+    """Get usernames shared by more than one user."""
+    pipeline = [
+        {"$group": {"_id": "$username", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    return [doc["_id"] async for doc in db.users.aggregate(pipeline)]
+
+
+async def migrate() -> bool:
+    """Replace a non-unique username index with a unique one."""
+    db = get_database()
+
+    existing = (await db.users.index_information()).get("username_1")
+    if existing and existing.get("unique"):
+        logger.info("Username index is already unique")
+        return True
+
+    # A unique build would fail on these, so leave the old index in place
+    duplicates = await find_duplicate_usernames(db)
+    if duplicates:
+        logger.error("Resolve duplicate usernames first: %s", ", ".join(map(str, duplicates)))
+        return False
+
+    if existing:
+        try:
+            await db.users.drop_index("username_1")
+        except OperationFailure as e:
+            if e.code != INDEX_NOT_FOUND:
+                raise
+
+    try:
+        await db.users.create_index("username", unique=True)
+    except OperationFailure:
+        # Don't leave username lookups without an index
+        await db.users.create_index("username")
+        raise
+
+    logger.info("Username index is now unique")
+    return True
+
+
+async def main() -> int:
+    """Run the migration against the configured database."""
+    await connect_to_mongo()
+    try:
+        return 0 if await migrate() else 1
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main()))
@@ -1,10 +1,26 @@
 """
 Data models for the chat application.
 """
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, Literal
+from pydantic import BaseModel, EmailStr, Field, AfterValidator
+from typing import Optional, Literal, Annotated
 from datetime import datetime
 from bson import ObjectId
+import re
+
+
+# Cheap shape check for emails the server already validated or produced itself
+_TRUSTED_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+
+def _fast_email_check(value: str) -> str:
+    """Validate email shape without the full email_validator pass."""
+    if not _TRUSTED_EMAIL_RE.fullmatch(value):
+        raise ValueError("Invalid email address")
+    return value
+
+
+# Use for server-populated fields; keep EmailStr for user-provided input
+TrustedEmail = Annotated[str, AfterValidator(_fast_email_check)]
 
 
 class PyObjectId(ObjectId):
@@ -27,13 +43,14 @@ class PyObjectId(ObjectId):
 
 class UserBase(BaseModel):
     """Base user model."""
-    email: EmailStr
+    email: TrustedEmail
     username: str
     full_name: Optional[str] = None
 
 
 class UserCreate(UserBase):
     """User creation model."""
+    email: EmailStr
     password: str
 
 
@@ -77,15 +94,16 @@ class MessageStatus(str):
 
 class MessageBase(BaseModel):
     """Base message model."""
-    sender: EmailStr
-    recipient: EmailStr
+    sender: TrustedEmail
+    recipient: TrustedEmail
     content: str
     is_bot_response: bool = False
 
 
 class MessageCreate(MessageBase):
     """Message creation model."""
-    pass
+    sender: EmailStr
+    recipient: EmailStr
 
 
 class Message(MessageBase):
@@ -110,7 +128,7 @@ class MessageUpdate(BaseModel):
 class ActivityLog(BaseModel):
     """Activity log model."""
     id: Optional[str] = Field(alias="_id", default=None)
-    user_email: EmailStr
+    user_email: TrustedEmail
     action: str
     details: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
@@ -122,7 +140,7 @@ class ActivityLog(BaseModel):
 
 class ChatListItem(BaseModel):
     """Chat list item for UI."""
-    contact_email: EmailStr
+    contact_email: TrustedEmail
     contact_name: str
     last_message: Optional[str] = None
     last_message_time: Optional[datetime] = None
@@ -21,7 +21,7 @@ async def get_activities(
 ):
     """Get recent activity logs."""
     activities = await get_recent_activities(limit)
-    return [ActivityLog(**activity) for activity in activities]
+    return [ActivityLog.model_construct(**activity) for activity in activities]
 
 
 @router.get("/activities/me", response_model=List[ActivityLog])
@@ -31,7 +31,7 @@ async def get_my_activities(
 ):
     """Get activity logs for current user."""
     activities = await get_user_activities(current_user.email, limit)
-    return [ActivityLog(**activity) for activity in activities]
+    return [ActivityLog.model_construct(**activity) for activity in activities]
 
 
 @router.get("/bot/history")
@@ -44,6 +44,14 @@ async def get_bot_conversation_history(
     return {"history": history}
 
 
+@router.get("/bot/stats")
+async def get_bot_stats(
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get bot memory usage statistics."""
+    return {"active_contexts": len(ai_bot.user_contexts)}
+
+
 @router.delete("/bot/history")
 async def clear_bot_conversation_history(
     current_user: User = Depends(get_current_active_user)
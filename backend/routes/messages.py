@@ -2,20 +2,35 @@
 REST API routes for message management.
 """
 from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import ORJSONResponse, Response
 from models import Message, MessageCreate, MessageUpdate, User, ChatListItem
 from auth import get_current_active_user
-from database import get_database
+from database import get_database, TEXT_SEARCH_MIN_LENGTH
 from activity import log_activity
+from cache import chat_list_key, get_cached_response, set_cached_response, invalidate_user_lists
 from bot import ai_bot, AIBot
-from datetime import datetime, timezone
+from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import ReturnDocument
 from typing import Optional, List
+import asyncio
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/messages", tags=["messages"])
 
+# Fields needed to build Message responses
+MESSAGE_PROJECTION = {
+    "sender": 1,
+    "recipient": 1,
+    "content": 1,
+    "timestamp": 1,
+    "status": 1,
+    "is_bot_response": 1
+}
+
 
 @router.post("/", response_model=Message, status_code=status.HTTP_201_CREATED)
 async def create_message(
@@ -41,26 +56,15 @@ async def create_message(
                 detail="Recipient not found"
             )
     
-    # Create message
+    # Create message; one clock read per request
+    now = datetime.utcnow()
     message_dict = message.model_dump()
-    message_dict["timestamp"] = datetime.now(timezone.utc).replace(tzinfo=None)
+    message_dict["timestamp"] = now
     message_dict["status"] = "Sent"
     
-    result = await db.messages.insert_one(message_dict)
-    message_dict["_id"] = str(result.inserted_id)
-    
-    # Log activity
-    await log_activity(
-        current_user.email,
-        "Message sent",
-        f"To: {message.recipient}"
-    )
-    
-    created_message = Message(**message_dict)
-    logger.info(f"Message created: {current_user.email} -> {message.recipient}")
-    
     # If message is to bot, generate response
-    if message.recipient == AIBot.BOT_EMAIL:
+    is_bot_message = message.recipient == AIBot.BOT_EMAIL
+    if is_bot_message:
         bot_response = ai_bot.process_message(current_user.email, message.content)
         
         # Create bot response message
@@ -69,14 +73,32 @@ async def create_message(
             "recipient": current_user.email,
             "content": bot_response,
             "is_bot_response": True,
-            "timestamp": datetime.now(timezone.utc).replace(tzinfo=None),
+            # Stored dates have millisecond precision; keep the reply strictly after
+            "timestamp": now + timedelta(milliseconds=1),
             "status": "Sent"
         }
         
-        await db.messages.insert_one(bot_message_dict)
-        
+        # Store the message and the bot's reply in one round-trip
+        result = await db.messages.insert_many([message_dict, bot_message_dict])
+        message_dict["_id"] = str(result.inserted_ids[0])
+    else:
+        result = await db.messages.insert_one(message_dict)
+        message_dict["_id"] = str(result.inserted_id)
+    await invalidate_user_lists(current_user.email, message.recipient)
+    
+    # Log activity
+    log_activity(
+        current_user.email,
+        "Message sent",
+        f"To: {message.recipient}"
+    )
+    
+    created_message = Message(**message_dict)
+    logger.info(f"Message created: {current_user.email} -> {message.recipient}")
+    
+    if is_bot_message:
         # Log bot activity
-        await log_activity(
+        log_activity(
             AIBot.BOT_EMAIL,
             "Bot replied",
             f"To: {current_user.email}"
@@ -85,7 +107,20 @@ async def create_message(
     return created_message
 
 
-@router.get("/", response_model=List[Message])
+def _serialize_message(msg: dict) -> dict:
+    """Shape a stored message like Message's JSON output (aliases, UTC 'Z' timestamps)."""
+    return {
+        "_id": str(msg["_id"]),
+        "sender": msg["sender"],
+        "recipient": msg["recipient"],
+        "content": msg["content"],
+        "is_bot_response": msg.get("is_bot_response", False),
+        "timestamp": msg["timestamp"].isoformat() + 'Z',
+        "status": msg.get("status", "Sent")
+    }
+
+
+@router.get("/", response_model=None, responses={200: {"model": List[Message]}})
 async def get_messages(
     contact_email: str,
     limit: int = Query(50, ge=1, le=200),
@@ -97,34 +132,32 @@ async def get_messages(
     
     logger.info(f"Getting messages between {current_user.email} and {contact_email}, limit={limit}, skip={skip}")
     
-    # Find messages between current user and contact
-    messages = await db.messages.find({
-        "$or": [
-            {"sender": current_user.email, "recipient": contact_email},
-            {"sender": contact_email, "recipient": current_user.email}
-        ]
-    }).sort("timestamp", 1).skip(skip).limit(limit).to_list(limit)
+    # Find messages between current user and contact, marking unread ones
+    # as delivered concurrently since neither operation needs the other's result
+    messages, _ = await asyncio.gather(
+        db.messages.find({
+            "$or": [
+                {"sender": current_user.email, "recipient": contact_email},
+                {"sender": contact_email, "recipient": current_user.email}
+            ]
+        }, MESSAGE_PROJECTION).sort("timestamp", 1).skip(skip).limit(limit).to_list(limit),
+        db.messages.update_many(
+            {
+                "sender": contact_email,
+                "recipient": current_user.email,
+                "status": "Sent"
+            },
+            {"$set": {"status": "Delivered"}}
+        )
+    )
     
     logger.info(f"Found {len(messages)} messages")
     
-    # Convert to Message models
-    message_list = []
-    for msg in messages:
-        msg["_id"] = str(msg["_id"])
-        message_list.append(Message(**msg))
-    
-    # Mark unread messages as delivered
-    await db.messages.update_many(
-        {
-            "sender": contact_email,
-            "recipient": current_user.email,
-            "status": "Sent"
-        },
-        {"$set": {"status": "Delivered"}}
-    )
+    # Serialize trusted rows directly, skipping response model validation
+    message_list = [_serialize_message(msg) for msg in messages]
     
     logger.info(f"Returning {len(message_list)} messages to client")
-    return message_list
+    return ORJSONResponse(message_list)
 
 
 @router.patch("/{message_id}", response_model=Message)
@@ -143,36 +176,39 @@ async def update_message(
             detail="Invalid message ID"
         )
     
-    # Find message
-    message = await db.messages.find_one({"_id": ObjectId(message_id)})
-    if not message:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Message not found"
+    # Update and fetch in one round-trip; the filter enforces that only
+    # the recipient can update status
+    update_data = message_update.model_dump(exclude_unset=True)
+    message_oid = ObjectId(message_id)
+    recipient_filter = {"_id": message_oid, "recipient": current_user.email}
+    if update_data:
+        updated_message = await db.messages.find_one_and_update(
+            recipient_filter,
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
+    else:
+        updated_message = await db.messages.find_one(recipient_filter)
     
-    # Verify user is recipient (only recipient can update status)
-    if message["recipient"] != current_user.email:
+    if not updated_message:
+        # Distinguish a missing message from someone else's
+        if await db.messages.find_one({"_id": message_oid}, {"_id": 1}):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only recipient can update message status"
+            )
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only recipient can update message status"
-        )
-    
-    # Update message
-    update_data = message_update.model_dump(exclude_unset=True)
-    if update_data:
-        await db.messages.update_one(
-            {"_id": ObjectId(message_id)},
-            {"$set": update_data}
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Message not found"
         )
     
-    # Get updated message
-    updated_message = await db.messages.find_one({"_id": ObjectId(message_id)})
     updated_message["_id"] = str(updated_message["_id"])
+    if update_data:
+        await invalidate_user_lists(current_user.email)
     
     # Log activity
     if message_update.status:
-        await log_activity(
+        log_activity(
             current_user.email,
             f"Message marked as {message_update.status}",
             f"Message ID: {message_id}"
@@ -184,9 +220,15 @@ async def update_message(
 @router.get("/chats", response_model=List[ChatListItem])
 async def get_chat_list(current_user: User = Depends(get_current_active_user)):
     """Get list of all chats for current user."""
+    # Serve a recent copy if one exists; message writes invalidate it
+    cache_key = chat_list_key(current_user.email)
+    cached = await get_cached_response(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
     db = get_database()
     
-    # Aggregate pipeline to get chat list with last message
+    # Aggregate pipeline to get chat list with last message, unread count and contact details
     pipeline = [
         {
             "$match": {
@@ -199,6 +241,17 @@ async def get_chat_list(current_user: User = Depends(get_current_active_user)):
         {
             "$sort": {"timestamp": -1}
         },
+        # Only carry the fields the grouping needs
+        {
+            "$project": {
+                "_id": 0,
+                "sender": 1,
+                "recipient": 1,
+                "content": 1,
+                "timestamp": 1,
+                "status": 1
+            }
+        },
         {
             "$group": {
                 "_id": {
@@ -210,44 +263,60 @@ async def get_chat_list(current_user: User = Depends(get_current_active_user)):
                 },
                 "last_message": {"$first": "$content"},
                 "last_message_time": {"$first": "$timestamp"},
-                "messages": {"$push": "$$ROOT"}
+                "unread_count": {
+                    "$sum": {
+                        "$cond": [
+                            {
+                                "$and": [
+                                    {"$eq": ["$recipient", current_user.email]},
+                                    {"$ne": ["$sender", current_user.email]},
+                                    {"$ne": ["$status", "Read"]}
+                                ]
+                            },
+                            1,
+                            0
+                        ]
+                    }
+                }
             }
         },
         {
             "$sort": {"last_message_time": -1}
+        },
+        {
+            "$limit": 100
+        },
+        {
+            "$lookup": {
+                "from": "users",
+                "localField": "_id",
+                "foreignField": "email",
+                "as": "contact"
+            }
+        },
+        # Drops chats whose contact no longer exists
+        {
+            "$unwind": "$contact"
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "contact_email": "$_id",
+                "contact_name": {"$ifNull": ["$contact.username", "$_id"]},
+                "last_message": 1,
+                "last_message_time": 1,
+                "unread_count": 1,
+                "is_bot": {"$ifNull": ["$contact.is_bot", False]}
+            }
         }
     ]
     
     chats = await db.messages.aggregate(pipeline).to_list(100)
     
-    # Get user details and unread counts
-    chat_list = []
-    for chat in chats:
-        contact_email = chat["_id"]
-        
-        # Get contact details
-        contact = await db.users.find_one({"email": contact_email})
-        if not contact:
-            continue
-        
-        # Count unread messages
-        unread_count = await db.messages.count_documents({
-            "sender": contact_email,
-            "recipient": current_user.email,
-            "status": {"$ne": "Read"}
-        })
-        
-        chat_item = ChatListItem(
-            contact_email=contact_email,
-            contact_name=contact.get("username", contact_email),
-            last_message=chat["last_message"],
-            last_message_time=chat["last_message_time"],
-            unread_count=unread_count,
-            is_bot=contact.get("is_bot", False)
-        )
-        chat_list.append(chat_item)
-    
-    return chat_list
+    # Documents already have the ChatListItem shape
+    payload = orjson.dumps(chats)
+    await set_cached_response(cache_key, payload)
+    return Response(content=payload, media_type="application/json")
 
 
 @router.get("/search", response_model=List[Message])
@@ -264,8 +333,7 @@ async def search_messages(
         "$or": [
             {"sender": current_user.email},
             {"recipient": current_user.email}
-        ],
-        "content": {"$regex": query, "$options": "i"}
+        ]
     }
     
     # Add contact filter if specified
@@ -275,13 +343,23 @@ async def search_messages(
             {"sender": contact_email, "recipient": current_user.email}
         ]
     
-    messages = await db.messages.find(search_filter).sort("timestamp", -1).limit(50).to_list(50)
+    # Use the text index for real words, regex only for very short queries
+    if len(query) >= TEXT_SEARCH_MIN_LENGTH:
+        search_filter["$text"] = {"$search": query}
+        cursor = db.messages.find(
+            search_filter, {**MESSAGE_PROJECTION, "score": {"$meta": "textScore"}}
+        ).sort([("score", {"$meta": "textScore"})])
+    else:
+        search_filter["content"] = {"$regex": query, "$options": "i"}
+        cursor = db.messages.find(search_filter, MESSAGE_PROJECTION).sort("timestamp", -1)
+    
+    messages = await cursor.limit(50).to_list(50)
     
     # Convert to Message models
     message_list = []
     for msg in messages:
         msg["_id"] = str(msg["_id"])
-        message_list.append(Message(**msg))
+        message_list.append(Message.model_construct(**msg))
     
     return message_list
 
@@ -2,6 +2,8 @@
 REST API routes for user management.
 """
 from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import Response
+from pydantic import TypeAdapter
 from models import User, UserCreate, UserLogin, Token
 from auth import (
     get_password_hash, 
@@ -10,37 +12,33 @@ from auth import (
     get_current_active_user,
     get_user_by_email
 )
-from database import get_database
+from pymongo.errors import DuplicateKeyError
+from database import get_database, is_username_index_unique
 from activity import log_activity
+from cache import contacts_key, get_cached_response, set_cached_response
 from datetime import datetime, timedelta
 from config import settings
+import asyncio
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
+# Never load password hashes for user listings
+USER_PROJECTION = {"hashed_password": 0}
+
+# Maximum users returned by search
+SEARCH_RESULT_LIMIT = 20
+
+_user_list_adapter = TypeAdapter(list[User])
+
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
 async def register_user(user: UserCreate):
     """Register a new user."""
     db = get_database()
     
-    # Check if user already exists
-    existing_user = await db.users.find_one({"email": user.email})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Check if username is taken
-    existing_username = await db.users.find_one({"username": user.username})
-    if existing_username:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already taken"
-        )
-
     # 🔒 PASSWORD LENGTH CHECK (✅ CORRECT PLACE)
     if len(user.password.encode("utf-8")) > 72:
         raise HTTPException(
@@ -48,19 +46,41 @@ async def register_user(user: UserCreate):
             detail="Password too long (maximum 72 characters)"
         )
     
+    # Older databases may lack the unique username index; check explicitly there
+    if not is_username_index_unique():
+        if await db.users.find_one({"username": user.username}, {"_id": 1}):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Username already taken"
+            )
+    
     # Create user
     user_dict = user.model_dump(exclude={"password"})
-    user_dict["hashed_password"] = get_password_hash(user.password)
+    # Hashing is CPU-bound; keep it off the event loop
+    user_dict["hashed_password"] = await asyncio.to_thread(get_password_hash, user.password)
     user_dict["is_active"] = True
     user_dict["is_bot"] = False
     user_dict["created_at"] = datetime.utcnow()
     user_dict["last_seen"] = None
     
-    result = await db.users.insert_one(user_dict)
+    # Unique indexes on email and username reject duplicates
+    try:
+        result = await db.users.insert_one(user_dict)
+    except DuplicateKeyError as e:
+        details = e.details or {}
+        # Older servers omit keyPattern; the index name is in the message
+        if "keyPattern" in details:
+            username_taken = "username" in details["keyPattern"]
+        else:
+            username_taken = "username_1" in details.get("errmsg", str(e))
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already taken" if username_taken else "Email already registered"
+        )
     user_dict["_id"] = str(result.inserted_id)
     
     # Log activity
-    await log_activity(user.email, "User registered", f"New user: {user.username}")
+    log_activity(user.email, "User registered", f"New user: {user.username}")
     
     # Create access token
     access_token = create_access_token(
@@ -87,7 +107,7 @@ async def login(user_login: UserLogin):
         )
     
     # Log activity
-    await log_activity(user.email, "User logged in")
+    log_activity(user.email, "User logged in")
     
     # Create access token
     access_token = create_access_token(
@@ -125,28 +145,39 @@ async def search_users(
     """Search users by username or email."""
     db = get_database()
     
-    # Search by username or email (partial match)
-    users = await db.users.find({
-        "$or": [
-            {"username": {"$regex": query, "$options": "i"}},
-            {"email": {"$regex": query, "$options": "i"}},
-            {"full_name": {"$regex": query, "$options": "i"}}
-        ],
-        "email": {"$ne": current_user.email}  # Exclude current user
-    }).limit(20).to_list(20)
-    
-    # Convert to User models
+    # Case-insensitive prefix match on username or email, and on any word of
+    # the full name (so "Smith" finds "Alice Smith")
+    escaped = re.escape(query)
+    prefix = {"$regex": f"^{escaped}", "$options": "i"}
+    word_prefix = {"$regex": f"(?:^|\\s){escaped}", "$options": "i"}
+    
+    # Fetch one extra so dropping the current user still leaves a full page
+    fetch_limit = SEARCH_RESULT_LIMIT + 1
+    users = await db.users.find(
+        {"$or": [{"username": prefix}, {"email": prefix}, {"full_name": word_prefix}]},
+        USER_PROJECTION
+    ).limit(fetch_limit).to_list(fetch_limit)
+    
+    # Convert to User models, excluding the current user
     user_list = []
     for user_data in users:
+        if user_data["email"] == current_user.email:
+            continue
         user_data["_id"] = str(user_data["_id"])
-        user_list.append(User(**user_data))
+        user_list.append(User.model_construct(**user_data))
     
-    return user_list
+    return user_list[:SEARCH_RESULT_LIMIT]
 
 
 @router.get("/contacts", response_model=list[User])
 async def get_contacts(current_user: User = Depends(get_current_active_user)):
     """Get all users that current user has chatted with."""
+    # Serve a recent copy if one exists; message writes invalidate it
+    cache_key = contacts_key(current_user.email)
+    cached = await get_cached_response(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
     db = get_database()
     
     # Find all unique users that current user has sent or received messages from
@@ -177,20 +208,20 @@ async def get_contacts(current_user: User = Depends(get_current_active_user)):
     
     result = await db.messages.aggregate(pipeline).to_list(1)
     
-    if not result or not result[0].get("contacts"):
-        return []
-    
-    contact_emails = result[0]["contacts"]
-    
-    # Fetch user details
-    users = await db.users.find({"email": {"$in": contact_emails}}).to_list(100)
-    
     user_list = []
-    for user_data in users:
-        user_data["_id"] = str(user_data["_id"])
-        user_list.append(User(**user_data))
-    
-    return user_list
+    if result and result[0].get("contacts"):
+        contact_emails = result[0]["contacts"]
+        
+        # Fetch user details
+        users = await db.users.find({"email": {"$in": contact_emails}}, USER_PROJECTION).to_list(100)
+        
+        for user_data in users:
+            user_data["_id"] = str(user_data["_id"])
+            user_list.append(User.model_construct(**user_data))
+    
+    payload = _user_list_adapter.dump_json(user_list, by_alias=True)
+    await set_cached_response(cache_key, payload)
+    return Response(content=payload, media_type="application/json")
 
 
 
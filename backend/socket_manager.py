@@ -1,14 +1,17 @@
 """
 WebSocket server for real-time messaging using Socket.IO.
 """
+import asyncio
 import socketio
-from typing import Dict, Set
+from typing import Dict, Set, Optional
 from models import Message
 from database import get_database
 from activity import log_activity
 from bot import ai_bot, AIBot
-from datetime import datetime, timezone
-from jose import jwt, JWTError
+from datetime import datetime, timedelta
+from bson import ObjectId
+from auth import decode_access_token
+from cache import redis_client, invalidate_user_lists
 from config import settings
 import logging
 
@@ -21,30 +24,125 @@ cors_origins = settings.cors_origins_list if settings.is_production else '*'
 
 logger.info(f"Socket.IO CORS Origins: {cors_origins}")
 
+# With Redis configured, emits fan out across all workers and presence is shared;
+# without it everything stays in this process
+client_manager = socketio.AsyncRedisManager(settings.REDIS_URL) if settings.REDIS_URL else None
+
+# Live workers refresh their users' presence keys every PRESENCE_REFRESH_SECONDS,
+# so keys left by a crashed worker expire within PRESENCE_TTL_SECONDS
+PRESENCE_TTL_SECONDS = 90
+PRESENCE_REFRESH_SECONDS = 30
+
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    client_manager=client_manager,
     cors_allowed_origins=cors_origins,
     logger=True if settings.is_development else False,
     engineio_logger=False
 )
 
-# Track connected users: {user_email: set(session_ids)}
+# Track sessions connected to this process: {user_email: set(session_ids)}
 connected_users: Dict[str, Set[str]] = {}
 
 # Track session to user mapping: {session_id: user_email}
 session_users: Dict[str, str] = {}
 
+_presence_task: Optional[asyncio.Task] = None
+
+
+def _presence_key(email: str) -> str:
+    """Redis key holding the session ids of an online user."""
+    return f"presence:{email}"
+
+
+async def add_presence(user_email: str, sid: str):
+    """Record a session for a user, locally and in Redis when available."""
+    if user_email not in connected_users:
+        connected_users[user_email] = set()
+    connected_users[user_email].add(sid)
+    
+    if redis_client:
+        key = _presence_key(user_email)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.sadd(key, sid)
+                pipe.expire(key, PRESENCE_TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Presence update failed for %s: %s", user_email, e)
+
+
+async def remove_presence(user_email: str, sid: str):
+    """Forget a session for a user."""
+    if user_email in connected_users:
+        connected_users[user_email].discard(sid)
+        if not connected_users[user_email]:
+            del connected_users[user_email]
+    
+    if redis_client:
+        try:
+            await redis_client.srem(_presence_key(user_email), sid)
+        except Exception as e:
+            logger.warning("Presence removal failed for %s: %s", user_email, e)
+
+
+async def is_user_online(email: str) -> bool:
+    """Check whether a user has any connected session on any worker."""
+    if redis_client:
+        try:
+            return bool(await redis_client.exists(_presence_key(email)))
+        except Exception as e:
+            # Fall back to the sessions this worker knows about
+            logger.warning("Presence lookup failed for %s: %s", email, e)
+    return email in connected_users
+
+
+async def _refresh_presence():
+    """Periodically extend the presence keys of users connected to this worker."""
+    while True:
+        await asyncio.sleep(PRESENCE_REFRESH_SECONDS)
+        if not connected_users:
+            continue
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for user_email, sids in connected_users.items():
+                    # Re-add sessions in case the key expired during an outage
+                    pipe.sadd(_presence_key(user_email), *sids)
+                    pipe.expire(_presence_key(user_email), PRESENCE_TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Presence refresh failed: %s", e)
+
+
+def start_presence_refresher():
+    """Start the background task that keeps presence keys alive (Redis only)."""
+    global _presence_task
+    if redis_client and _presence_task is None:
+        _presence_task = asyncio.create_task(_refresh_presence())
+        logger.info("Presence refresher started")
+
+
+async def stop_presence_refresher():
+    """Stop the presence refresher."""
+    global _presence_task
+    if _presence_task is None:
+        return
+    
+    task, _presence_task = _presence_task, None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    logger.info("Presence refresher stopped")
+
 
 async def verify_token(token: str) -> str:
     """Verify JWT token and return user email."""
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise ValueError("Invalid token")
-        return email
-    except JWTError:
+    email = decode_access_token(token)
+    if email is None:
         raise ValueError("Invalid token")
+    return email
 
 
 @sio.event
@@ -62,10 +160,9 @@ async def connect(sid, environ, auth):
         # Store session mapping
         session_users[sid] = user_email
         
-        # Add to connected users
-        if user_email not in connected_users:
-            connected_users[user_email] = set()
-        connected_users[user_email].add(sid)
+        # Add to connected users; the per-user room lets any worker reach this session
+        await sio.enter_room(sid, user_email)
+        await add_presence(user_email, sid)
         
         logger.info(f"User connected: {user_email} (session: {sid})")
         
@@ -73,7 +170,7 @@ async def connect(sid, environ, auth):
         await sio.emit('connected', {'email': user_email}, room=sid)
         
         # Log activity
-        await log_activity(user_email, "WebSocket connected")
+        log_activity(user_email, "WebSocket connected")
         
         return True
         
@@ -90,10 +187,7 @@ async def disconnect(sid):
             user_email = session_users[sid]
             
             # Remove from connected users
-            if user_email in connected_users:
-                connected_users[user_email].discard(sid)
-                if not connected_users[user_email]:
-                    del connected_users[user_email]
+            await remove_presence(user_email, sid)
             
             # Remove session mapping
             del session_users[sid]
@@ -101,7 +195,7 @@ async def disconnect(sid):
             logger.info(f"User disconnected: {user_email} (session: {sid})")
             
             # Log activity
-            await log_activity(user_email, "WebSocket disconnected")
+            log_activity(user_email, "WebSocket disconnected")
             
     except Exception as e:
         logger.error(f"Disconnection error: {e}")
@@ -127,22 +221,48 @@ async def send_message(sid, data):
         content = data['content']
         
         logger.info(f" Message from {sender_email} to {recipient_email}: {content[:50]}")
+        recipient_online = await is_user_online(recipient_email)
         logger.info(f" Connected users: {list(connected_users.keys())}")
-        logger.info(f" Is recipient online? {recipient_email in connected_users}")
+        logger.info(f" Is recipient online? {recipient_online}")
         
-        # Create message in database
+        # Create message in database; one clock read per message
         db = get_database()
+        now = datetime.utcnow()
+        is_bot_message = recipient_email == AIBot.BOT_EMAIL
+        message_oid = ObjectId()
         message_dict = {
+            "_id": message_oid,
             "sender": sender_email,
             "recipient": recipient_email,
             "content": content,
             "is_bot_response": False,
-            "timestamp": datetime.now(timezone.utc).replace(tzinfo=None),
-            "status": "Sent"
+            "timestamp": now,
+            # The bot reads messages as soon as it replies
+            "status": "Read" if is_bot_message else "Sent"
         }
         
-        result = await db.messages.insert_one(message_dict)
-        message_dict["_id"] = str(result.inserted_id)
+        if is_bot_message:
+            # If message is to bot, generate response
+            bot_response = ai_bot.process_message(sender_email, content)
+            
+            # Bot message is read immediately if the user has a session here
+            bot_message_dict = {
+                "_id": ObjectId(),
+                "sender": AIBot.BOT_EMAIL,
+                "recipient": sender_email,
+                "content": bot_response,
+                "is_bot_response": True,
+                # Stored dates have millisecond precision; keep the reply strictly after
+                "timestamp": now + timedelta(milliseconds=1),
+                "status": "Read" if sender_email in connected_users else "Sent"
+            }
+            
+            # Store the message and the bot's reply in one round-trip
+            await db.messages.insert_many([message_dict, bot_message_dict])
+        else:
+            await db.messages.insert_one(message_dict)
+        message_dict["_id"] = str(message_oid)
+        await invalidate_user_lists(sender_email, recipient_email)
         
         # Create response message
         message_response = {
@@ -159,21 +279,20 @@ async def send_message(sid, data):
         await sio.emit('message_sent', message_response, room=sid)
         
         # Send to recipient if online (or if it's the bot)
-        if recipient_email in connected_users:
+        if recipient_online:
             logger.info(f" Recipient {recipient_email} is ONLINE - sending message")
             # Update message to Delivered status
             message_response_delivered = message_response.copy()
             message_response_delivered["status"] = "Delivered"
             
-            logger.info(f" Broadcasting to {len(connected_users[recipient_email])} session(s)")
-            for recipient_sid in connected_users[recipient_email]:
-                logger.info(f"   → Sending to session {recipient_sid}")
-                await sio.emit('new_message', message_response_delivered, room=recipient_sid)
-            
-            # Update status in database
-            await db.messages.update_one(
-                {"_id": result.inserted_id},
-                {"$set": {"status": "Delivered"}}
+            # Room named after the user reaches their sessions on every worker,
+            # while the status update is stored concurrently
+            await asyncio.gather(
+                sio.emit('new_message', message_response_delivered, room=recipient_email),
+                db.messages.update_one(
+                    {"_id": message_oid},
+                    {"$set": {"status": "Delivered"}}
+                )
             )
             
             # Notify sender about delivery
@@ -182,12 +301,9 @@ async def send_message(sid, data):
                 "status": "Delivered"
             }
             await sio.emit('message_delivered', delivery_notification, room=sid)
-        elif recipient_email == AIBot.BOT_EMAIL:
-            # Bot always "receives" messages instantly
-            await db.messages.update_one(
-                {"_id": result.inserted_id},
-                {"$set": {"status": "Delivered"}}
-            )
+        elif is_bot_message:
+            # Bot always "receives" messages instantly; the stored status
+            # is already Read since the reply was generated above
             
             # Notify sender that bot received the message
             delivery_notification = {
@@ -197,20 +313,15 @@ async def send_message(sid, data):
             await sio.emit('message_delivered', delivery_notification, room=sid)
         else:
             logger.warning(f" Recipient {recipient_email} is OFFLINE - message stored for later")
+            # Presence only decides the Delivered status; still reach any live
+            # session it missed (a no-op if the room is empty)
+            await sio.emit('new_message', message_response, room=recipient_email)
         
         # Log activity
-        await log_activity(sender_email, "Message sent via WebSocket", f"To: {recipient_email}")
+        log_activity(sender_email, "Message sent via WebSocket", f"To: {recipient_email}")
         
-        # If message is to bot, generate response
-        if recipient_email == AIBot.BOT_EMAIL:
-            bot_response = ai_bot.process_message(sender_email, content)
-            
-            # Mark user's message as Read by bot
-            await db.messages.update_one(
-                {"_id": result.inserted_id},
-                {"$set": {"status": "Read"}}
-            )
-            
+        # Deliver the bot's response
+        if is_bot_message:
             # Notify sender that bot read the message
             read_notification = {
                 "message_id": message_dict["_id"],
@@ -218,22 +329,9 @@ async def send_message(sid, data):
             }
             await sio.emit('message_read', read_notification, room=sid)
             
-            # Create bot message in database
-            bot_message_dict = {
-                "sender": AIBot.BOT_EMAIL,
-                "recipient": sender_email,
-                "content": bot_response,
-                "is_bot_response": True,
-                "timestamp": datetime.now(timezone.utc).replace(tzinfo=None),
-                "status": "Sent"
-            }
-            
-            bot_result = await db.messages.insert_one(bot_message_dict)
-            bot_message_dict["_id"] = str(bot_result.inserted_id)
-            
             # Send bot response
             bot_response_message = {
-                "message_id": bot_message_dict["_id"],
+                "message_id": str(bot_message_dict["_id"]),
                 "sender": AIBot.BOT_EMAIL,
                 "recipient": sender_email,
                 "content": bot_response,
@@ -244,17 +342,10 @@ async def send_message(sid, data):
             
             # Send to all user's sessions
             if sender_email in connected_users:
-                for user_sid in connected_users[sender_email]:
-                    await sio.emit('new_message', bot_response_message, room=user_sid)
-                
-                # Mark bot message as delivered and read immediately
-                await db.messages.update_one(
-                    {"_id": bot_result.inserted_id},
-                    {"$set": {"status": "Read"}}
-                )
+                await sio.emit('new_message', bot_response_message, room=sender_email)
             
             # Log bot activity
-            await log_activity(AIBot.BOT_EMAIL, "Bot replied via WebSocket", f"To: {sender_email}")
+            log_activity(AIBot.BOT_EMAIL, "Bot replied via WebSocket", f"To: {sender_email}")
         
     except Exception as e:
         logger.error(f"Error sending message: {e}")
@@ -277,14 +368,14 @@ async def mark_as_read(sid, data):
         
         # Update message status
         db = get_database()
-        from bson import ObjectId
         
         if not ObjectId.is_valid(message_id):
             return
+        message_oid = ObjectId(message_id)
         
         result = await db.messages.update_one(
             {
-                "_id": ObjectId(message_id),
+                "_id": message_oid,
                 "recipient": user_email
             },
             {"$set": {"status": "Read"}}
@@ -292,22 +383,23 @@ async def mark_as_read(sid, data):
         
         if result.modified_count > 0:
             # Get message to notify sender
-            message = await db.messages.find_one({"_id": ObjectId(message_id)})
+            message, _ = await asyncio.gather(
+                db.messages.find_one({"_id": message_oid}),
+                invalidate_user_lists(user_email)
+            )
             if message:
                 sender_email = message['sender']
                 
-                # Notify sender if online
-                if sender_email in connected_users:
-                    read_notification = {
-                        "message_id": message_id,
-                        "status": "Read",
-                        "read_by": user_email
-                    }
-                    for sender_sid in connected_users[sender_email]:
-                        await sio.emit('message_read', read_notification, room=sender_sid)
+                # Notify sender (no-op if they have no sessions)
+                read_notification = {
+                    "message_id": message_id,
+                    "status": "Read",
+                    "read_by": user_email
+                }
+                await sio.emit('message_read', read_notification, room=sender_email)
             
             # Log activity
-            await log_activity(user_email, "Message marked as read", f"Message ID: {message_id}")
+            log_activity(user_email, "Message marked as read", f"Message ID: {message_id}")
         
     except Exception as e:
         logger.error(f"Error marking message as read: {e}")
@@ -328,14 +420,12 @@ async def typing(sid, data):
         recipient_email = data['recipient']
         is_typing = data.get('is_typing', True)
         
-        # Send typing indicator to recipient if online
-        if recipient_email in connected_users:
-            typing_data = {
-                "sender": sender_email,
-                "is_typing": is_typing
-            }
-            for recipient_sid in connected_users[recipient_email]:
-                await sio.emit('user_typing', typing_data, room=recipient_sid)
+        # Send typing indicator to recipient (no-op if they have no sessions)
+        typing_data = {
+            "sender": sender_email,
+            "is_typing": is_typing
+        }
+        await sio.emit('user_typing', typing_data, room=recipient_email)
         
     except Exception as e:
         logger.error(f"Error handling typing indicator: {e}")
@@ -349,7 +439,7 @@ async def get_online_status(sid, data):
             return
         
         email = data['email']
-        is_online = email in connected_users
+        is_online = await is_user_online(email)
         
         await sio.emit('online_status', {
             'email': email,